@@ -1,15 +1,33 @@
 import csv
+import heapq
 import json
 import logging
 import os
+import pickle
 import re
 import sys
 import time
 from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Optional, List, Dict, Tuple
-
+from html import escape
+from operator import attrgetter, itemgetter
+from typing import Optional, List, Dict, Tuple, Iterable
+from urllib.parse import unquote
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson  # optional: faster JSON parsing of search responses
+except ImportError:
+    orjson = None
 
 # -----------------------------
 # Config
@@ -17,7 +35,8 @@ import requests
 SUBREDDIT = os.environ.get("SUBREDDIT", "television").strip()
 QUERY = os.environ.get("QUERY", "Heated Rivalry").strip()
 
-LIMIT = int(os.environ.get("LIMIT", "100"))          # search results to pull
+LIMIT = int(os.environ.get("LIMIT", "100"))          # search results to pull (per page, max 100)
+PAGES = max(1, int(os.environ.get("PAGES", "1")))    # follow `after` cursor for up to this many pages (>= 1)
 OTHER_POSTS_N = int(os.environ.get("OTHER_N", "5"))  # 3-5 recommended
 SORT = os.environ.get("SORT", "new")                 # new | top | relevance
 TIME_FILTER = os.environ.get("T", "all")             # all | year | month | week | day
@@ -41,7 +60,19 @@ LOG_FILE = os.path.join(LOG_DIR, "tv_tracker.log")
 ALL_POSTS_CSV = os.path.join(OUT_DIR, "television_heatedrivalry_all_posts.csv")
 EPISODE_POSTS_CSV = os.path.join(OUT_DIR, "television_heatedrivalry_episode_posts.csv")
 SELECTED_POSTS_CSV = os.path.join(OUT_DIR, "television_heatedrivalry_selected_posts.csv")
+# legacy append-only history; imported once into HISTORY_DIR, no longer written
 COMMENT_HISTORY_CSV = os.path.join(DATA_DIR, "television_heatedrivalry_comment_history.csv")
+# parquet dataset, one partition (directory) per snapshot
+HISTORY_DIR = os.path.join(DATA_DIR, "history")
+# post_id -> [num_comments of its last history row, snapshot_utc it was last fetched in]
+LAST_COUNTS_JSON = os.path.join(DATA_DIR, "last_counts.json")
+LAST_COUNTS_MAX = 2000  # least recently seen ids are evicted past this
+# post_id -> (episode_code, is_trailer) for the posts in the latest fetch; Reddit titles are
+# immutable, so entries only go stale if the episode/trailer rules change (delete the file when they do)
+TITLE_CACHE_PKL = os.path.join(DATA_DIR, "title_cache.pkl")
+# per-post comment series for the plots, extended with each new snapshot
+PLOT_CACHE_PKL = os.path.join(DATA_DIR, "plot_cache.pkl")
+PLOT_CACHE_VERSION = 4  # bump when the cached layout changes; old caches are rebuilt
 
 EPISODE_PLOT_PNG = os.path.join(OUT_DIR, "episode_comment_growth.png")
 NON_EPISODE_PLOT_PNG = os.path.join(OUT_DIR, "non_episode_comment_growth.png")
@@ -71,31 +102,45 @@ def safe_int(x, default=0):
 # -----------------------------
 # Episode parsing
 # -----------------------------
-EP_PATTERNS = [
-    # 1x01, 1X02, 10x3 (normalize)
-    re.compile(r"\b(\d{1,2})\s*[xX]\s*(\d{1,2})\b"),
-    # S01E01, s1e2
-    re.compile(r"\b[Ss](\d{1,2})\s*[Ee](\d{1,2})\b"),
-]
+# one pass per title: 1x01 / 1X02 / 10x3 or S01E01 / s1e2 (normalized)
+EP_RE = re.compile(
+    r"\b(?:(?P<s1>\d{1,2})\s*[xX]\s*(?P<e1>\d{1,2})|[Ss](?P<s2>\d{1,2})\s*[Ee](?P<e2>\d{1,2}))\b"
+)
+
+# keep it simple; you can tighten if needed
+_TRAILER_RE = re.compile(r"(?is)(?=.*trailer)(?=.*official)(?=.*heated rivalry)")
 
 def extract_episode_code(title: str) -> Optional[str]:
-    for pat in EP_PATTERNS:
-        m = pat.search(title)
-        if m:
-            season = int(m.group(1))
-            ep = int(m.group(2))
-            return f"{season}x{ep:02d}"
-    return None
+    m = EP_RE.search(title)
+    if not m:
+        return None
+    if m.group("s1") is not None:
+        season, ep = int(m.group("s1")), int(m.group("e1"))
+    else:
+        season, ep = int(m.group("s2")), int(m.group("e2"))
+    return f"{season}x{ep:02d}"
 
 def is_official_trailer(title: str) -> bool:
-    t = title.lower()
-    # keep it simple; you can tighten if needed
-    return ("trailer" in t) and ("official" in t) and ("heated rivalry" in t)
+    return _TRAILER_RE.match(title) is not None
+
+def load_title_cache() -> Dict[str, Tuple[Optional[str], bool]]:
+    try:
+        with open(TITLE_CACHE_PKL, "rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception:
+        logging.warning(f"Ignoring unreadable title cache: {TITLE_CACHE_PKL}")
+        return {}
+
+def save_title_cache(cache: Dict[str, Tuple[Optional[str], bool]]):
+    with open(TITLE_CACHE_PKL, "wb") as f:
+        pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
 
 # -----------------------------
 # Data model
 # -----------------------------
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Post:
     id: str
     name: str
@@ -113,37 +158,7 @@ class Post:
 # -----------------------------
 # HTTP helpers
 # -----------------------------
-def request_json(session: requests.Session, url: str, params: dict, max_retries: int = 5) -> dict:
-    # polite backoff for 429 / transient failures
-    for attempt in range(1, max_retries + 1):
-        r = session.get(url, params=params, timeout=30, allow_redirects=True)
-        if r.status_code == 429:
-            retry_after = r.headers.get("Retry-After")
-            wait = int(retry_after) if retry_after and retry_after.isdigit() else min(60, 2 ** attempt)
-            logging.warning(f"HTTP 429 rate-limited. Waiting {wait}s (attempt {attempt}/{max_retries})...")
-            time.sleep(wait)
-            continue
-
-        if 500 <= r.status_code < 600:
-            wait = min(60, 2 ** attempt)
-            logging.warning(f"HTTP {r.status_code}. Waiting {wait}s (attempt {attempt}/{max_retries})...")
-            time.sleep(wait)
-            continue
-
-        r.raise_for_status()
-
-        ct = (r.headers.get("Content-Type") or "").lower()
-        if "json" not in ct:
-            raise ValueError(f"Expected JSON but got Content-Type={ct}. Final URL: {r.url}")
-
-        return r.json()
-
-    raise RuntimeError("Failed after retries (rate-limited or server errors).")
-
-# -----------------------------
-# Reddit fetch
-# -----------------------------
-def fetch_search_posts() -> List[Post]:
+def make_session() -> requests.Session:
     session = requests.Session()
     session.headers.update({
         "User-Agent": USER_AGENT,
@@ -152,7 +167,34 @@ def fetch_search_posts() -> List[Post]:
         "Cache-Control": "no-cache",
         "Pragma": "no-cache",
     })
+    # polite backoff for 429 / transient failures, handled inside urllib3 on a pooled connection
+    retry = Retry(
+        total=5,
+        backoff_factor=1.0,
+        status_forcelist=[429, 500, 502, 503, 504],
+        respect_retry_after_header=True,
+        allowed_methods=["GET"],
+    )
+    session.mount("https://", HTTPAdapter(max_retries=retry, pool_connections=4, pool_maxsize=4))
+    return session
+
+SESSION = make_session()
+
+def request_json(session: requests.Session, url: str, params: dict) -> dict:
+    r = session.get(url, params=params, timeout=30, allow_redirects=True)
+    r.raise_for_status()
+
+    ct = (r.headers.get("Content-Type") or "").lower()
+    if "json" not in ct:
+        raise ValueError(f"Expected JSON but got Content-Type={ct}. Final URL: {r.url}")
+
+    # r.content is already gzip-decoded bytes; orjson parses it without a str decode
+    return orjson.loads(r.content) if orjson else r.json()
 
+# -----------------------------
+# Reddit fetch
+# -----------------------------
+def fetch_search_children() -> List[dict]:
     params = {
         "q": QUERY,
         "restrict_sr": 1,
@@ -162,24 +204,51 @@ def fetch_search_posts() -> List[Post]:
         "raw_json": 1,
     }
 
-    logging.info(f"Searching r/{SUBREDDIT} for '{QUERY}' (limit={LIMIT}, sort={SORT}, t={TIME_FILTER})")
-    data = request_json(session, SEARCH_URL, params=params)
+    logging.info(f"Searching r/{SUBREDDIT} for '{QUERY}' (limit={LIMIT}, pages={PAGES}, sort={SORT}, t={TIME_FILTER})")
+
+    # each page's cursor comes from the previous response, so pages are fetched in order;
+    # they share SESSION's keep-alive connection rather than reconnecting per page
+    children: List[dict] = []
+    for _ in range(PAGES):
+        data = (request_json(SESSION, SEARCH_URL, params=params).get("data") or {})
+        children.extend(data.get("children") or [])
+        after = data.get("after")
+        if not after:
+            break
+        params["after"] = after
+        params["count"] = len(children)
+
+    return children
 
-    children = (data.get("data") or {}).get("children") or []
+# same text as datetime.fromtimestamp(ts, tz=timezone.utc).isoformat() for whole-second
+# epochs (created_utc is truncated to int), without building a datetime per post
+_ISO_UTC = "%Y-%m-%dT%H:%M:%S+00:00"
+
+def fetch_search_posts() -> List[Post]:
+    children = fetch_search_children()
+    title_cache = load_title_cache()
+    # only ids from this fetch are kept, so the cache stays the size of one search
+    fresh_cache: Dict[str, Tuple[Optional[str], bool]] = {}
+    inserted = False
     posts: List[Post] = []
+    seen = set()
 
     for ch in children:
         d = ch.get("data") or {}
         pid = d.get("id")
-        if not pid:
+        if not pid or pid in seen:
             continue
+        seen.add(pid)
 
         created_utc = safe_int(d.get("created_utc"), 0)
-        created_iso = datetime.fromtimestamp(created_utc, tz=timezone.utc).isoformat() if created_utc else ""
+        created_iso = time.strftime(_ISO_UTC, time.gmtime(created_utc)) if created_utc else ""
 
         title = d.get("title") or ""
-        ep = extract_episode_code(title)
-        trailer = is_official_trailer(title)
+        cached = title_cache.get(pid)
+        if cached is None:
+            cached = (extract_episode_code(title), is_official_trailer(title))
+            inserted = True
+        ep, trailer = fresh_cache[pid] = cached
 
         posts.append(Post(
             id=pid,
@@ -196,206 +265,344 @@ def fetch_search_posts() -> List[Post]:
             is_trailer=trailer,
         ))
 
+    # steady state (same posts as last run) skips the rewrite entirely
+    if inserted or len(fresh_cache) != len(title_cache):
+        save_title_cache(fresh_cache)
     logging.info(f"Found {len(posts)} posts")
     return posts
 
 # -----------------------------
 # CSV writers
 # -----------------------------
-def write_csv(path: str, rows: List[dict], fieldnames: List[str]):
-    with open(path, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=fieldnames)
-        w.writeheader()
-        for r in rows:
-            w.writerow(r)
-
-def ensure_history_header(path: str):
-    if os.path.exists(path):
+ALL_POSTS_COLUMNS = [
+    "id", "created_utc", "created_iso", "title", "episode_code", "is_trailer",
+    "num_comments", "score", "author", "permalink", "url",
+]
+EPISODE_POSTS_COLUMNS = ["episode_code", "id", "created_iso", "title", "num_comments", "score", "permalink"]
+SELECTED_POSTS_COLUMNS = ["type", "episode_code", "id", "created_iso", "title", "num_comments", "score", "permalink"]
+
+def post_row(p: Post) -> tuple:
+    # one projection in ALL_POSTS_COLUMNS order; the other outputs are index selections of it
+    return (
+        p.id, p.created_utc, p.created_iso, p.title, p.episode_code or "", 1 if p.is_trailer else 0,
+        p.num_comments, p.score, p.author, p.permalink, p.url,
+    )
+
+def post_type(p: Post) -> str:
+    return "Trailer" if p.is_trailer else ("Episode" if p.episode_code else "Other")
+
+_EPISODE_ROW = itemgetter(*(ALL_POSTS_COLUMNS.index(c) for c in EPISODE_POSTS_COLUMNS))
+_SELECTED_ROW = itemgetter(*(ALL_POSTS_COLUMNS.index(c) for c in SELECTED_POSTS_COLUMNS[1:]))
+
+def write_csv(path: str, rows: Iterable[tuple], fieldnames: List[str]):
+    # rows are tuples in fieldnames order; csv.writer skips DictWriter's per-cell dict lookups
+    with open(path, "w", newline="", encoding="utf-8", buffering=1 << 20) as f:
+        w = csv.writer(f)
+        w.writerow(fieldnames)
+        w.writerows(rows)
+
+# -----------------------------
+# History (parquet)
+# -----------------------------
+HISTORY_SCHEMA = pa.schema([
+    ("snapshot_utc", pa.string()),
+    ("post_id", pa.string()),
+    ("post_name", pa.string()),
+    ("episode_code", pa.string()),
+    ("is_episode", pa.bool_()),
+    ("is_trailer", pa.bool_()),
+    ("title", pa.string()),
+    ("permalink", pa.string()),
+    ("num_comments", pa.int32()),
+])
+
+# snapshot_utc is stored in the directory name; read it back as a plain string
+HISTORY_PARTITIONING = ds.partitioning(pa.schema([("snapshot_utc", pa.string())]), flavor="hive")
+
+def migrate_legacy_history():
+    # one-time import of the old CSV history so existing series keep plotting
+    if os.path.exists(HISTORY_DIR) or not os.path.exists(COMMENT_HISTORY_CSV):
         return
-    with open(path, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=[
-            "snapshot_utc", "post_id", "post_name", "episode_code", "is_episode",
-            "is_trailer", "title", "permalink", "num_comments"
-        ])
-        w.writeheader()
-
-def append_history(snapshot_utc: str, posts: List[Post]):
-    ensure_history_header(COMMENT_HISTORY_CSV)
-    with open(COMMENT_HISTORY_CSV, "a", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=[
-            "snapshot_utc", "post_id", "post_name", "episode_code", "is_episode",
-            "is_trailer", "title", "permalink", "num_comments"
-        ])
-        for p in posts:
-            w.writerow({
-                "snapshot_utc": snapshot_utc,
-                "post_id": p.id,
-                "post_name": p.name,
-                "episode_code": p.episode_code or "",
-                "is_episode": 1 if p.episode_code else 0,
-                "is_trailer": 1 if p.is_trailer else 0,
-                "title": p.title,
-                "permalink": p.permalink,
-                "num_comments": p.num_comments,
-            })
+    table = pa_csv.read_csv(COMMENT_HISTORY_CSV, convert_options=pa_csv.ConvertOptions(column_types=HISTORY_SCHEMA))
+    # the CSV wrote "" for "no episode"; only that column becomes null (titles stay strings)
+    i = table.schema.get_field_index("episode_code")
+    episode_code = table.column(i)
+    table = table.set_column(i, "episode_code", pc.if_else(pc.equal(episode_code, ""), None, episode_code))
+    pq.write_to_dataset(table, root_path=HISTORY_DIR, partition_cols=["snapshot_utc"])
+    logging.info(f"Imported {table.num_rows} legacy history rows into {HISTORY_DIR}")
+
+def load_last_counts() -> Dict[str, list]:
+    try:
+        with open(LAST_COUNTS_JSON, "r", encoding="utf-8") as f:
+            last_counts = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception:
+        logging.warning(f"Ignoring unreadable last counts: {LAST_COUNTS_JSON}")
+        return {}
+    # older files stored a bare count with no last-seen snapshot
+    return {pid: v if isinstance(v, list) else [v, None] for pid, v in last_counts.items()}
+
+def save_last_counts(last_counts: Dict[str, list]):
+    with open(LAST_COUNTS_JSON, "w", encoding="utf-8") as f:
+        json.dump(last_counts, f)
+
+def append_history(snapshot_utc: str, posts: List[Post]) -> List[Post]:
+    # counts only mean something relative to an existing history
+    last_counts = load_last_counts() if os.path.exists(HISTORY_DIR) else {}
+    migrate_legacy_history()
+
+    # skip posts whose comment count hasn't moved since their last recorded row
+    changed = [p for p in posts if (last_counts.get(p.id) or [None])[0] != p.num_comments]
+    logging.info(f"History: {len(changed)} posts with new comment counts")
+    if changed:
+        # one pass over posts builds every row; zip(*) transposes them into columns
+        rows = [(
+            p.id, p.name, p.episode_code, bool(p.episode_code), p.is_trailer, p.title, p.permalink, p.num_comments,
+        ) for p in changed]
+        columns = [pa.repeat(pa.scalar(snapshot_utc), len(rows))]
+        columns.extend(pa.array(col, type=typ) for col, typ in zip(zip(*rows), HISTORY_SCHEMA.types[1:]))
+        table = pa.Table.from_arrays(columns, schema=HISTORY_SCHEMA)
+        # each snapshot lands in its own partition (one file, one write); existing files are never rewritten
+        pq.write_to_dataset(table, root_path=HISTORY_DIR, partition_cols=["snapshot_utc"])
+
+    # every fetched post counts as seen, changed or not; re-insert so dict order is
+    # least -> most recently seen, then evict from the front
+    for p in posts:
+        last_counts.pop(p.id, None)
+        last_counts[p.id] = [p.num_comments, snapshot_utc]
+    for pid in list(last_counts)[:max(0, len(last_counts) - LAST_COUNTS_MAX)]:
+        del last_counts[pid]
+    save_last_counts(last_counts)
+    return changed
 
 # -----------------------------
 # Selection logic
 # -----------------------------
-def pick_trailer(posts: List[Post]) -> Optional[Post]:
-    trailers = [p for p in posts if p.is_trailer]
-    if not trailers:
-        return None
-    # pick highest-comment trailer
-    return sorted(trailers, key=lambda p: p.num_comments, reverse=True)[0]
-
-def pick_other_posts(posts: List[Post], n: int) -> List[Post]:
-    # exclude episode threads; exclude trailer
-    candidates = [p for p in posts if not p.episode_code and not p.is_trailer]
-    # pick by comment count, then score as tiebreaker
-    candidates = sorted(candidates, key=lambda p: (p.num_comments, p.score), reverse=True)
-    return candidates[:n]
-
-def episode_posts(posts: List[Post]) -> List[Post]:
-    eps = [p for p in posts if p.episode_code]
+# C-level sort keys; avoids a Python lambda call per post
+_BY_COMMENTS = attrgetter("num_comments")
+_BY_COMMENTS_SCORE = attrgetter("num_comments", "score")
+_BY_EPISODE_DATE = attrgetter("episode_code", "created_utc")
+
+def classify_posts(posts: List[Post]) -> Tuple[List[Post], List[Post], List[Post]]:
+    # one pass into (trailers, episodes, others); a trailer that also carries an
+    # episode code lands in both trailers and episodes
+    trailers: List[Post] = []
+    eps: List[Post] = []
+    others: List[Post] = []
+    for p in posts:
+        if p.is_trailer:
+            trailers.append(p)
+        if p.episode_code:
+            eps.append(p)
+        elif not p.is_trailer:
+            others.append(p)
+    return trailers, eps, others
+
+def select_posts(posts: List[Post], n: int) -> Tuple[List[Post], Optional[Post], List[Post]]:
+    trailers, eps, others = classify_posts(posts)
+    # pick highest-comment trailer; O(n), no intermediate list
+    trailer = max(trailers, key=_BY_COMMENTS, default=None)
+    # pick by comment count, then score as tiebreaker; top-n heap instead of a full sort
+    top_others = heapq.nlargest(n, others, key=_BY_COMMENTS_SCORE)
     # sort by episode then date
-    eps.sort(key=lambda p: (p.episode_code, p.created_utc))
-    return eps
+    eps.sort(key=_BY_EPISODE_DATE)
+    return eps, trailer, top_others
 
 # -----------------------------
 # Plotting (matplotlib)
 # -----------------------------
-def make_plots():
+def load_plot_cache() -> Optional[dict]:
+    try:
+        with open(PLOT_CACHE_PKL, "rb") as f:
+            cache = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        logging.warning(f"Ignoring unreadable plot cache: {PLOT_CACHE_PKL}")
+        return None
+    if not isinstance(cache, dict) or cache.get("version") != PLOT_CACHE_VERSION:
+        return None
+    return cache
+
+def save_plot_cache(cache: dict):
+    with open(PLOT_CACHE_PKL, "wb") as f:
+        pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+def history_snapshots() -> List[str]:
+    # partition directories are named "snapshot_utc=<uri-encoded iso>"; listing them is cheap
+    if not os.path.exists(HISTORY_DIR):
+        return []
+    prefix = "snapshot_utc="
+    return [unquote(name[len(prefix):]) for name in os.listdir(HISTORY_DIR) if name.startswith(prefix)]
+
+def read_history(snapshots: Optional[List[str]] = None):
+    # all of history, or only the given snapshot partitions (pruned by directory, not by scanning rows)
+    import pandas as pd
+
+    filters = [("snapshot_utc", "in", snapshots)] if snapshots is not None else None
+    # Load history (typed columns, only what the plots need). Files are memory-mapped, so only
+    # the pages holding those column chunks are touched and they come straight from the OS cache.
+    df = pq.ParquetDataset(
+        HISTORY_DIR, partitioning=HISTORY_PARTITIONING, filters=filters, memory_map=True, pre_buffer=False,
+    ).read(
+        columns=["post_id", "post_name", "snapshot_utc", "num_comments", "is_episode", "episode_code", "title"]
+    ).to_pandas()
+    df["snapshot_utc"] = pd.to_datetime(df["snapshot_utc"], utc=True, format="ISO8601", errors="coerce")
+    return df.dropna(subset=["snapshot_utc"])
+
+def fold_history(by_post: Dict[str, dict], df) -> Optional[datetime]:
+    # append history rows to the cached series; returns the newest snapshot folded in
+    import pandas as pd
+
+    if df.empty:
+        return None
+
+    last_snapshot = df["snapshot_utc"].max().to_pydatetime()
+    # series are kept as naive-UTC datetime64 / int32 arrays, which matplotlib converts without
+    # a per-point Python call
+    df["snapshot_utc"] = df["snapshot_utc"].dt.tz_localize(None)
+
+    # partitions usually come back in snapshot order already; otherwise sort the whole
+    # frame once (stable) so every group below is a time-ordered series without a per-post sort
+    if not df["snapshot_utc"].is_monotonic_increasing:
+        df = df.sort_values("snapshot_utc", kind="stable")
+
+    for post_name, g in df.groupby("post_name", sort=False):
+        t = g["snapshot_utc"].to_numpy(dtype="datetime64[us]")
+        n = g["num_comments"].to_numpy(dtype=np.int32)
+        entry = by_post.get(post_name)
+        if entry is None:
+            first = g.iloc[0]
+            by_post[post_name] = {
+                "id": first["post_id"],
+                "is_episode": bool(first["is_episode"]),
+                "episode_code": first["episode_code"] if pd.notna(first["episode_code"]) else None,
+                "title": first["title"] if pd.notna(first["title"]) else "",
+                "t": t,
+                "n": n,
+                "seen": t[-1],
+            }
+        else:
+            entry["t"] = np.concatenate([entry["t"], t])
+            entry["n"] = np.concatenate([entry["n"], n])
+            entry["seen"] = max(entry["seen"], t[-1])
+    return last_snapshot
+
+def seed_seen(by_post: Dict[str, dict]):
+    # history only holds changes; last_counts.json knows when each post was last fetched at all
+    last_counts = load_last_counts()
+    for entry in by_post.values():
+        seen = (last_counts.get(entry["id"]) or [None, None])[1]
+        if seen:
+            entry["seen"] = max(entry["seen"], np.datetime64(datetime.fromisoformat(seen).replace(tzinfo=None), "us"))
+
+def build_plot_cache() -> dict:
+    # cold start only: aggregate the full history once, later runs just extend it
+    cache = {"version": PLOT_CACHE_VERSION, "last_snapshot": None, "by_post": {}}
+    if os.path.exists(HISTORY_DIR):
+        cache["last_snapshot"] = fold_history(cache["by_post"], read_history())
+        seed_seen(cache["by_post"])
+    return cache
+
+def update_plot_cache(cache: dict, snapshot_utc: str, changed: List[Post], fetched: List[Post]):
+    # changed are the rows append_history just wrote for snapshot_utc; fetched is every post
+    # the search returned, which only moves each series' last-seen time
+    dt = datetime.fromisoformat(snapshot_utc)
+    last = cache["last_snapshot"]
+    if last and dt <= last:
+        return  # already aggregated (e.g. cache was just rebuilt from history)
+
+    # catch up on snapshots that reached history without reaching the cache
+    # (a run that failed between append_history and save_plot_cache)
+    missed = sorted(
+        (s for s in history_snapshots() if s != snapshot_utc and (last is None or datetime.fromisoformat(s) > last)),
+        key=datetime.fromisoformat,
+    )
+    if missed:
+        logging.info(f"Plot cache: folding in {len(missed)} missed history snapshot(s)")
+        fold_history(cache["by_post"], read_history(missed))
+        seed_seen(cache["by_post"])
+
+    # the current snapshot comes straight from posts, no need to read back its partition
+    t = np.datetime64(dt.replace(tzinfo=None), "us")
+    by_post = cache["by_post"]
+    for p in changed:
+        entry = by_post.get(p.name)
+        if entry is None:
+            entry = by_post[p.name] = {
+                "id": p.id,
+                "is_episode": bool(p.episode_code),
+                "episode_code": p.episode_code,
+                "title": p.title,
+                "t": np.empty(0, dtype="datetime64[us]"),
+                "n": np.empty(0, dtype=np.int32),
+            }
+        entry["t"] = np.append(entry["t"], t)
+        entry["n"] = np.append(entry["n"], np.int32(p.num_comments))
+    for p in fetched:
+        entry = by_post.get(p.name)
+        if entry is not None:
+            entry["seen"] = t
+    cache["last_snapshot"] = dt
+
+def make_plots(snapshot_utc: str, changed: List[Post], fetched: List[Post]):
     import matplotlib.pyplot as plt
 
-    if not os.path.exists(COMMENT_HISTORY_CSV):
+    cache = load_plot_cache()
+    if cache is None:
+        cache = build_plot_cache()
+    update_plot_cache(cache, snapshot_utc, changed, fetched)
+    save_plot_cache(cache)
+
+    by_post: Dict[str, dict] = cache["by_post"]
+    if not by_post:
         logging.warning("No comment history yet; skipping plots. Run script multiple times over days to build history.")
         return
 
-    # Load history
-    history_rows = []
-    with open(COMMENT_HISTORY_CSV, "r", newline="", encoding="utf-8") as f:
-        r = csv.DictReader(f)
-        for row in r:
-            history_rows.append(row)
-
-    def parse_dt(s: str):
-        # isoformat with timezone
-        try:
-            return datetime.fromisoformat(s)
-        except Exception:
-            return None
-
-    # group by post_name
-    by_post: Dict[str, List[Tuple[datetime, int, dict]]] = {}
-    for row in history_rows:
-        dt = parse_dt(row["snapshot_utc"])
-        if not dt:
-            continue
-        post_name = row["post_name"]
-        num_comments = safe_int(row["num_comments"], 0)
-        by_post.setdefault(post_name, []).append((dt, num_comments, row))
-
-    # sort each series by time
-    for k in list(by_post.keys()):
-        by_post[k].sort(key=lambda x: x[0])
-
-    # Episode plot: one line per episode post (post_name)
-    plt.figure()
-    plotted_any = False
-    for post_name, series in by_post.items():
-        # determine if episode
-        is_episode = series[0][2].get("is_episode") == "1"
-        if not is_episode:
-            continue
-        x = [t for (t, _, __) in series]
-        y = [c for (_, c, __) in series]
-        label = series[0][2].get("episode_code") or post_name
-        plt.plot(x, y, label=label)
-        plotted_any = True
-
-    if plotted_any:
-        plt.title("Episode discussion comment counts over time")
-        plt.xlabel("Snapshot time (UTC)")
-        plt.ylabel("Comments")
-        plt.xticks(rotation=30, ha="right")
-        plt.tight_layout()
-        plt.legend(loc="best", fontsize=8)
-        plt.savefig(EPISODE_PLOT_PNG, dpi=150)
-        plt.close()
-        logging.info(f"Wrote plot: {EPISODE_PLOT_PNG}")
-    else:
-        plt.close()
-
-    # Non-episode plot: exclude episode discussions
-    plt.figure()
-    plotted_any = False
-    for post_name, series in by_post.items():
-        is_episode = series[0][2].get("is_episode") == "1"
-        if is_episode:
-            continue
-        x = [t for (t, _, __) in series]
-        y = [c for (_, c, __) in series]
-        # shorter label
-        title = (series[0][2].get("title") or "")[:40].strip()
-        label = title + ("…" if len(series[0][2].get("title") or "") > 40 else "")
-        plt.plot(x, y, label=label)
-        plotted_any = True
-
-    if plotted_any:
-        plt.title("Non-episode Heated Rivalry posts: comment counts over time")
-        plt.xlabel("Snapshot time (UTC)")
-        plt.ylabel("Comments")
-        plt.xticks(rotation=30, ha="right")
-        plt.tight_layout()
-        # legend can get messy; keep it small
-        plt.legend(loc="best", fontsize=7)
-        plt.savefig(NON_EPISODE_PLOT_PNG, dpi=150)
-        plt.close()
-        logging.info(f"Wrote plot: {NON_EPISODE_PLOT_PNG}")
-    else:
-        plt.close()
+    # One pass over the series, each line dispatched to the episode or non-episode figure
+    fig_ep, ax_ep = plt.subplots()
+    fig_ne, ax_ne = plt.subplots()
+    for post_name, entry in by_post.items():
+        x, y = entry["t"], entry["n"]
+        # history only records count changes: carry the last count forward to the last snapshot
+        # that actually fetched the post (not past it) and draw steps, so flat posts stay visible
+        if x[-1] < entry["seen"]:
+            x = np.append(x, entry["seen"])
+            y = np.append(y, y[-1])
+        if entry["is_episode"]:
+            # one line per episode post (post_name)
+            ax_ep.plot(x, y, label=entry["episode_code"] or post_name, drawstyle="steps-post")
+        else:
+            # shorter label
+            full_title = entry["title"] or post_name
+            ax_ne.plot(x, y, label=full_title[:40].strip() + ("…" if len(full_title) > 40 else ""),
+                       drawstyle="steps-post")
+
+    save_plot(fig_ep, ax_ep, "Episode discussion comment counts over time", EPISODE_PLOT_PNG, legend_fontsize=8)
+    # legend can get messy; keep it small
+    save_plot(fig_ne, ax_ne, "Non-episode Heated Rivalry posts: comment counts over time", NON_EPISODE_PLOT_PNG,
+              legend_fontsize=7)
+
+def save_plot(fig, ax, title: str, path: str, legend_fontsize: int):
+    import matplotlib.pyplot as plt
+
+    if ax.lines:
+        ax.set_title(title)
+        ax.set_xlabel("Snapshot time (UTC)")
+        ax.set_ylabel("Comments")
+        plt.setp(ax.get_xticklabels(), rotation=30, ha="right")
+        fig.tight_layout()
+        ax.legend(loc="best", fontsize=legend_fontsize)
+        fig.savefig(path, dpi=150)
+        logging.info(f"Wrote plot: {path}")
+    plt.close(fig)
 
 # -----------------------------
 # HTML dashboard
 # -----------------------------
-def write_dashboard_html(all_posts: List[Post], eps: List[Post], trailer: Optional[Post], others: List[Post]):
-    def row_for(p: Post) -> str:
-        ep = p.episode_code or ""
-        kind = "Episode" if p.episode_code else ("Trailer" if p.is_trailer else "Other")
-        return f"""
-        <tr>
-          <td>{kind}</td>
-          <td>{ep}</td>
-          <td><a href="{p.permalink}" target="_blank" rel="noopener">{p.title}</a></td>
-          <td style="text-align:right">{p.num_comments}</td>
-          <td style="text-align:right">{p.score}</td>
-          <td>{p.created_iso}</td>
-        </tr>
-        """
-
-    trailer_html = ""
-    if trailer:
-        trailer_html = f"""
-        <h2>Official Trailer (best match)</h2>
-        <table>
-          <thead><tr><th>Title</th><th>Comments</th><th>Score</th><th>Created (UTC)</th></tr></thead>
-          <tbody>
-            <tr>
-              <td><a href="{trailer.permalink}" target="_blank" rel="noopener">{trailer.title}</a></td>
-              <td style="text-align:right">{trailer.num_comments}</td>
-              <td style="text-align:right">{trailer.score}</td>
-              <td>{trailer.created_iso}</td>
-            </tr>
-          </tbody>
-        </table>
-        """
-
-    others_rows = "\n".join(row_for(p) for p in others)
-
-    eps_rows = "\n".join(row_for(p) for p in eps)
-
-    html = f"""<!doctype html>
+# Static chunks are built once; only the head, trailer and rows are formatted per run.
+DASHBOARD_HEAD_TMPL = """<!doctype html>
 <html>
 <head>
   <meta charset="utf-8" />
@@ -411,37 +618,48 @@ def write_dashboard_html(all_posts: List[Post], eps: List[Post], trailer: Option
   </style>
 </head>
 <body>
-  <h1>r/{SUBREDDIT}: Heated Rivalry tracking</h1>
+  <h1>r/{subreddit}: Heated Rivalry tracking</h1>
   <p class="muted">
-    Query: <code>{QUERY}</code> · Generated: <code>{utc_now_iso()}</code><br/>
+    Query: <code>{query}</code> · Generated: <code>{generated}</code><br/>
     Data source: Reddit public JSON search endpoint (no OAuth key).
   </p>
+"""
 
-  {trailer_html}
-
-  <h2>Episode discussion threads detected</h2>
+TRAILER_TMPL = """
+  <h2>Official Trailer (best match)</h2>
   <table>
-    <thead>
-      <tr><th>Type</th><th>Episode</th><th>Title</th><th>Comments</th><th>Score</th><th>Created (UTC)</th></tr>
-    </thead>
+    <thead><tr><th>Title</th><th>Comments</th><th>Score</th><th>Created (UTC)</th></tr></thead>
     <tbody>
-      {eps_rows if eps_rows else "<tr><td colspan='6' class='muted'>No episode threads detected by title pattern.</td></tr>"}
+      <tr>
+        <td><a href="{permalink}" target="_blank" rel="noopener">{title}</a></td>
+        <td style="text-align:right">{num_comments}</td>
+        <td style="text-align:right">{score}</td>
+        <td>{created_iso}</td>
+      </tr>
     </tbody>
   </table>
+"""
 
-  <h2>Other notable posts (top by comments)</h2>
+POSTS_TABLE_HEAD_TMPL = """
+  <h2>{heading}</h2>
   <table>
     <thead>
       <tr><th>Type</th><th>Episode</th><th>Title</th><th>Comments</th><th>Score</th><th>Created (UTC)</th></tr>
     </thead>
     <tbody>
-      {others_rows if others_rows else "<tr><td colspan='6' class='muted'>No additional posts selected.</td></tr>"}
-    </tbody>
+"""
+EP_TABLE_HEAD = POSTS_TABLE_HEAD_TMPL.format(heading="Episode discussion threads detected")
+OTHERS_TABLE_HEAD = POSTS_TABLE_HEAD_TMPL.format(heading="Other notable posts (top by comments)")
+EP_TABLE_EMPTY = "      <tr><td colspan='6' class='muted'>No episode threads detected by title pattern.</td></tr>\n"
+OTHERS_TABLE_EMPTY = "      <tr><td colspan='6' class='muted'>No additional posts selected.</td></tr>\n"
+TABLE_TAIL = """    </tbody>
   </table>
+"""
 
+DASHBOARD_TAIL = f"""
   <h2>Comment growth over time</h2>
   <p class="muted">
-    These plots require multiple snapshots. Re-run the script daily/hourly (Task Scheduler) to build <code>comment_history.csv</code>.
+    These plots require multiple snapshots. Re-run the script daily/hourly (Task Scheduler) to build the comment history.
   </p>
 
   <h3>Episode discussions</h3>
@@ -455,13 +673,63 @@ def write_dashboard_html(all_posts: List[Post], eps: List[Post], trailer: Option
     <li><code>{os.path.basename(ALL_POSTS_CSV)}</code></li>
     <li><code>{os.path.basename(EPISODE_POSTS_CSV)}</code></li>
     <li><code>{os.path.basename(SELECTED_POSTS_CSV)}</code></li>
-    <li><code>comment_history.csv</code> (in /data; appended each run)</li>
+    <li><code>history/</code> (parquet, in /data; one partition per run, changed comment counts only)</li>
   </ul>
 </body>
 </html>
 """
-    with open(DASHBOARD_HTML, "w", encoding="utf-8") as f:
-        f.write(html)
+
+ROW_TMPL = """      <tr>
+        <td>{kind}</td>
+        <td>{ep}</td>
+        <td><a href="{permalink}" target="_blank" rel="noopener">{title}</a></td>
+        <td style="text-align:right">{num_comments}</td>
+        <td style="text-align:right">{score}</td>
+        <td>{created_iso}</td>
+      </tr>
+"""
+
+def write_dashboard_html(all_posts: List[Post], eps: List[Post], trailer: Optional[Post], others: List[Post]):
+    def row_for(p: Post) -> str:
+        # titles are user-supplied, so escape them
+        return ROW_TMPL.format(
+            kind="Episode" if p.episode_code else ("Trailer" if p.is_trailer else "Other"),
+            ep=p.episode_code or "",
+            permalink=escape(p.permalink),
+            title=escape(p.title),
+            num_comments=p.num_comments,
+            score=p.score,
+            created_iso=p.created_iso,
+        )
+
+    # stream chunk by chunk instead of assembling the whole page in memory
+    with open(DASHBOARD_HTML, "w", encoding="utf-8", buffering=1 << 20) as f:
+        f.write(DASHBOARD_HEAD_TMPL.format(subreddit=escape(SUBREDDIT), query=escape(QUERY), generated=utc_now_iso()))
+
+        if trailer:
+            f.write(TRAILER_TMPL.format(
+                permalink=escape(trailer.permalink),
+                title=escape(trailer.title),
+                num_comments=trailer.num_comments,
+                score=trailer.score,
+                created_iso=trailer.created_iso,
+            ))
+
+        f.write(EP_TABLE_HEAD)
+        for p in eps:
+            f.write(row_for(p))
+        if not eps:
+            f.write(EP_TABLE_EMPTY)
+        f.write(TABLE_TAIL)
+
+        f.write(OTHERS_TABLE_HEAD)
+        for p in others:
+            f.write(row_for(p))
+        if not others:
+            f.write(OTHERS_TABLE_EMPTY)
+        f.write(TABLE_TAIL)
+
+        f.write(DASHBOARD_TAIL)
     logging.info(f"Wrote dashboard HTML: {DASHBOARD_HTML}")
 
 # -----------------------------
@@ -472,61 +740,28 @@ def main():
     try:
         posts = fetch_search_posts()
 
-        # Write all posts CSV
-        all_rows = [{
-            "id": p.id,
-            "created_utc": p.created_utc,
-            "created_iso": p.created_iso,
-            "title": p.title,
-            "episode_code": p.episode_code or "",
-            "is_trailer": 1 if p.is_trailer else 0,
-            "num_comments": p.num_comments,
-            "score": p.score,
-            "author": p.author,
-            "permalink": p.permalink,
-            "url": p.url,
-        } for p in posts]
-
-        write_csv(ALL_POSTS_CSV, all_rows, list(all_rows[0].keys()) if all_rows else
-                  ["id","created_utc","created_iso","title","episode_code","is_trailer","num_comments","score","author","permalink","url"])
-
-        eps = episode_posts(posts)
-        eps_rows = [{
-            "episode_code": p.episode_code,
-            "id": p.id,
-            "created_iso": p.created_iso,
-            "title": p.title,
-            "num_comments": p.num_comments,
-            "score": p.score,
-            "permalink": p.permalink,
-        } for p in eps]
-        write_csv(EPISODE_POSTS_CSV, eps_rows, ["episode_code","id","created_iso","title","num_comments","score","permalink"])
-
-        trailer = pick_trailer(posts)
-        others = pick_other_posts(posts, OTHER_POSTS_N)
+        # Project every post to a row tuple once; the episode/selected CSVs reuse those tuples
+        all_rows = [post_row(p) for p in posts]
+        write_csv(ALL_POSTS_CSV, all_rows, ALL_POSTS_COLUMNS)
+        row_by_id = {r[0]: r for r in all_rows}
+
+        eps, trailer, others = select_posts(posts, OTHER_POSTS_N)
+
+        write_csv(EPISODE_POSTS_CSV, (_EPISODE_ROW(row_by_id[p.id]) for p in eps), EPISODE_POSTS_COLUMNS)
 
         selected = []
         if trailer:
             selected.append(trailer)
         selected.extend(others)
 
-        sel_rows = [{
-            "type": ("Trailer" if p.is_trailer else ("Episode" if p.episode_code else "Other")),
-            "episode_code": p.episode_code or "",
-            "id": p.id,
-            "created_iso": p.created_iso,
-            "title": p.title,
-            "num_comments": p.num_comments,
-            "score": p.score,
-            "permalink": p.permalink,
-        } for p in selected]
-        write_csv(SELECTED_POSTS_CSV, sel_rows, ["type","episode_code","id","created_iso","title","num_comments","score","permalink"])
-
-        # Append history snapshot for time series plots
-        append_history(snapshot, posts)
+        sel_rows = ((post_type(p),) + _SELECTED_ROW(row_by_id[p.id]) for p in selected)
+        write_csv(SELECTED_POSTS_CSV, sel_rows, SELECTED_POSTS_COLUMNS)
+
+        # Append history snapshot for time series plots (only posts whose count changed)
+        changed = append_history(snapshot, posts)
 
         # Build plots from history
-        make_plots()
+        make_plots(snapshot, changed, posts)
 
         # Write HTML dashboard
         write_dashboard_html(posts, eps, trailer, others)